@@ -9,22 +9,25 @@
             dm_shell.wait_for_shell()
             dm.stclc_mod_exists("sync://ds-wanip-sec14-chips-2:3065/Projects/MAGNUS_TOP")
 """
-import argparse
 import datetime
+import io
 import os
+import queue
 import re
-import smtplib
 import sys
+import threading
 from collections import defaultdict
-from email.message import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
 from pathlib import Path
 from textwrap import dedent
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
 
 import tabulate
 
 import pandas as pd
-from lxml.etree import ElementTree as ET
+from lxml.etree import iterparse
 
 try:
     import log
@@ -40,6 +43,125 @@ except ImportError:
     import Process
 LOGGER = log.getLogger(__name__)
 
+# Maximum number of extra stclc shells used to run independent commands in parallel
+SHELL_POOL_SIZE = 4
+
+# Precomputed stclc switches, indexed by the bitmask of the boolean arguments
+_POP_ARGS = ("", "-rec", "-force", "-rec -force")  # rec | force << 1
+_RELEASE_ARGS = (  # skip_check | on_server << 1
+    "",
+    "-skipcheck",
+    "-_fromserver",
+    "-skipcheck -_fromserver",
+)
+
+
+# Switches of the ls command used to scan modules
+LS_LOCKED = "-rec -workspace -locked -path -format list"
+LS_MODIFIED = "-rec -modified -path -format list"
+LS_UNMANAGED = "-unmanaged -rec -path -format list"
+
+# Output of each path in a stclc_multi_scan response is framed by these markers
+_MULTI_LS_RE = re.compile(r"<<<(.*?)>>>\n(.*?)\n?<<<END>>>", re.S)
+
+# Columns following the module name in the sitr status report
+_SITR_STATUS_KEYS = ("selector", "baseline", "relpath", "status")
+
+# Selector of a submitted SITaR module version (e.g. v1.12)
+_VER_RE = re.compile(r"v\d\.\d+$")
+
+# Markers framing the result of a command in stream_command_resp
+_RESP_BEGIN = "<<<RESP-BEGIN>>>"
+_RESP_END = "<<<RESP-END>>>"
+
+# Characters that have to be escaped inside a double quoted Tcl word
+_TCL_ESCAPES = str.maketrans(
+    {
+        "\\": "\\\\",
+        '"': '\\"',
+        "$": "\\$",
+        "[": "\\[",
+        "]": "\\]",
+        "{": "\\{",
+        "}": "\\}",
+    }
+)
+
+
+def _tcl_str(string: str) -> str:
+    """quote a string (e.g. a comment) so that it is passed to stclc verbatim"""
+    return '"' + string.translate(_TCL_ESCAPES) + '"'
+
+
+def _join_args(*args: str) -> str:
+    """join the non-empty arguments of a stclc command with single spaces"""
+    return " ".join(arg for arg in args if arg)
+
+
+def _populate_cmd(
+    url: str = "", force: bool = False, rec: bool = True, args: str = ""
+) -> str:
+    """build the stclc populate command"""
+    return _join_args("populate", _POP_ARGS[rec | force << 1], url, args)
+
+
+def _update_cmd(module: str, config: str = "") -> str:
+    """build the stclc command to put a module in update mode"""
+    return _join_args("sitr update", f"-config {config}" if config else "", module)
+
+
+def _compare_cmd(args: str = "", args2: str = "") -> str:
+    """build the stclc compare command"""
+    return _join_args("compare", args, args2)
+
+
+def _sitr_lookup_cmd(module: str = "") -> str:
+    """build the stclc command looking up the new submits of a module (all if empty)"""
+    return _join_args("sitr lookup -report script", module)
+
+
+def _tag_files_cmd(tag: str, paths: List[str], args: str = "") -> str:
+    """build the stclc command tagging the files/paths with the specified tag"""
+    return _join_args("tag", args, tag, *paths)
+
+
+def _tag_cmd(tag: str, path: str, args: str = "") -> str:
+    """build the stclc tag command, raising a Tcl error if any of the files could
+    not be tagged so that a LinkedCmd stops at this step"""
+    cmd = _tag_files_cmd(tag, [path], args)
+    return (
+        f"set tagged [{cmd}]; "
+        f"if {{[llength [lindex $tagged 1]]}} {{error [lindex $tagged 1]}}"
+    )
+
+
+def _addhref_cmd(container: str, module: str, relpath: str) -> str:
+    """build the stclc command adding a module to the specified container"""
+    return f"addhref {container} {module} -relpath {relpath}"
+
+
+class LinkedCmd(NamedTuple):
+    """stclc commands sent as one item of stclc_batch, each step only runs if the
+    previous ones succeeded"""
+
+    steps: List[str]
+
+
+def _link_steps(cmd: Union[str, LinkedCmd]) -> str:
+    """join the steps of a LinkedCmd into a single Tcl script"""
+    return "; ".join(cmd.steps) if isinstance(cmd, LinkedCmd) else cmd
+
+
+def _catch_each(cmds: List[Union[str, LinkedCmd]]) -> str:
+    """join the commands into a single Tcl script where each command runs in its
+    own catch, raising a Tcl error at the end if any of them failed"""
+    script = "; ".join(
+        f"if {{[catch {{{_link_steps(cmd)}}} err]}} {{puts $err; incr failed}}"
+        for cmd in cmds
+    )
+    check = 'if {$failed} {error "$failed of the commands failed"}'
+    return f"set failed 0; {script}; {check}"
+
 
 def _add_to_kv_list(kv_list, string: str) -> bool:
     """split a string and add words to the kv_list"""
@@ -138,6 +260,22 @@ def parse_kv_response(response: str) -> Dict:
     return kv_list
 
 
+def parse_list_response(response: str) -> List:
+    """parse a list formatted response, responses that do not start with a brace
+    (empty or error responses) are returned as an empty list without parsing"""
+    if not response or not response.lstrip().startswith("{"):
+        return []
+    return parse_kv_response(response)
+
+
+def get_list_files(response: str) -> List[Dict]:
+    """parse a list formatted ls response and return the list of files"""
+    parsed = parse_list_response(response)
+    if parsed:
+        return get_files(parsed[0])
+    return []
+
+
 def get_files(kv_response: Dict) -> List[Dict]:
     """after a command has been parsed, this routine will convert into a list of files"""
     if kv_response.get("type") == "file":
@@ -201,6 +339,25 @@ def prompt_to_continue(msg: str = "Continue") -> bool:
     return resp.lower().startswith("y")
 
 
+@lru_cache(maxsize=64)
+def read_project_xml_value(fname: str, mtime_ns: int, section: str, key: str) -> str:
+    """read the `key` attribute of the root -> section -> values -> anon element of
+    an XML file, the mtime is part of the cache key so a changed file is re-read"""
+    # Stream the file and stop at the first matching element instead of building
+    # the whole document
+    try:
+        for _, anon in iterparse(fname, tag="anon"):
+            ancestors = [elem.tag for elem in anon.iterancestors()]
+            if len(ancestors) == 3 and ancestors[:2] == ["values", section]:
+                return anon.attrib[key]
+            anon.clear()
+    except Exception as err:
+        LOGGER.exception("Cannot parse %s: %s", fname, str(err))
+        return ""
+    LOGGER.error("Cannot find %s/values/anon in %s", section, fname)
+    return ""
+
+
 class Dsync(object):
     """Class for accessing Design Sync
     This class should be used with the Process class (which starts up the stclc
@@ -213,6 +370,23 @@ class Dsync(object):
         shrc_project: specify a file to source before starting the process
     """
 
+    __slots__ = (
+        "test_mode",
+        "env",
+        "cwd",
+        "shrc_project",
+        "bsub_mode",
+        "workspace_type",
+        "tapeout_tag",
+        "shell",
+        "_run",
+        "_stream",
+        "_sitr_modules",
+        "_branch_cache",
+        "_top_vault",
+        "_shell_pool",
+    )
+
     # Methods to initialize the Class
     def __init__(
         self,
@@ -228,6 +402,14 @@ class Dsync(object):
         self.shrc_project = ""
         self.bsub_mode = bsub_mode
         self.workspace_type = "Design"
+        self._shell_pool = None
+        self.reset_caches()
+
+    def reset_caches(self) -> None:
+        """forget the workspace details cached from previous stclc responses"""
+        self._sitr_modules = None
+        self._branch_cache = None
+        self._top_vault = None
 
     def set_shrc_project(self, fname: "Path") -> None:
         """set the file to source before starting the process"""
@@ -250,6 +432,104 @@ class Dsync(object):
         shell.cwd = self.cwd
         shell.env = self.env
         self.shell = shell
+        # A new stclc shell may see a different workspace state
+        self.reset_caches()
+        # Commands that change the workspace are skipped in test mode, bind the
+        # variant once instead of passing test_mode on every command.
+        if self.test_mode:
+            self._run = self._skip_command
+            self._stream = self._skip_command
+        else:
+            self._run = shell.run_command
+            self._stream = shell.stream_command
+
+    def _skip_command(self, cmd: str) -> str:
+        """stand-in for sending a command in test mode, only log the command"""
+        LOGGER.info(f"cmd = {cmd}")
+        return ""
+
+    def clone_shell(self) -> "Process":
+        """return a new (not started) shell configured the same as the stclc shell"""
+        shell = type(self.shell)()
+        for attr in ("prompt", "command", "end_cmd", "init_timeout", "timeout", "cwd"):
+            setattr(shell, attr, getattr(self.shell, attr))
+        shell.env = self.shell.env
+        return shell
+
+    def shell_pool(self) -> List["Process"]:
+        """return the extra stclc shells in the workspace, they are started on first
+        use and shut down with the main shell, the main shell is used if none come up"""
+        if self._shell_pool is not None:
+            return self._shell_pool or [self.shell]
+        stack = ExitStack()
+        shells = []
+        # All of the shells are started before waiting for any of them
+        for _ in range(SHELL_POOL_SIZE):
+            shell = self.clone_shell()
+            stack.enter_context(shell.run_shell())
+            shells.append(shell)
+        self._shell_pool = []
+        for shell in shells:
+            if not shell.wait_for_shell():
+                LOGGER.warn("Could not start a pooled DM shell")
+                continue
+            shell.run_command("cdws")
+            self._shell_pool.append(shell)
+        stack.callback(setattr, self, "_shell_pool", None)
+        self.shell.on_close.append(stack.close)
+        return self._shell_pool or [self.shell]
+
+    def map_shells(
+        self, func: Callable[["Process", str], str], cmds: List[str], size: int
+    ) -> List[str]:
+        """call func(shell, cmd) for each command on a pool of stclc shells, each
+        shell only runs one command at a time, return the results in order"""
+        # A cloned shell would submit another interactive bsub job
+        if self.bsub_mode:
+            return [func(self.shell, cmd) for cmd in cmds]
+        shells = self.shell_pool()[: min(len(cmds), size)]
+        idle = queue.Queue()
+        for shell in shells:
+            idle.put(shell)
+
+        def run(cmd: str) -> str:
+            shell = idle.get()
+            try:
+                return func(shell, cmd)
+            finally:
+                idle.put(shell)
+
+        with ThreadPoolExecutor(max_workers=len(shells)) as executor:
+            return list(executor.map(run, cmds))
+
+    def run_parallel(self, cmds: List[str], size: int = SHELL_POOL_SIZE) -> List[str]:
+        """run independent commands on a pool of stclc shells, return the responses
+        in order"""
+        if len(cmds) < 2:
+            return [self.shell.run_command(cmd) for cmd in cmds]
+        return self.map_shells(lambda shell, cmd: shell.run_command(cmd), cmds, size)
+
+    def stream_parallel(
+        self, cmds: Dict[str, str], size: int = SHELL_POOL_SIZE
+    ) -> None:
+        """stream independent commands (title -> command) on a pool of stclc shells,
+        the output of each command is printed as one block when it completes"""
+        if self.test_mode or len(cmds) < 2:
+            for title, cmd in cmds.items():
+                print(title)
+                self.stream_command(cmd)
+            return
+        titles = {cmd: title for title, cmd in cmds.items()}
+        lock = threading.Lock()
+
+        def stream(shell: "Process", cmd: str) -> str:
+            resp = "".join(shell.stream_command(cmd))
+            with lock:
+                print(titles[cmd])
+                print(resp, end="")
+            return resp
+
+        self.map_shells(stream, list(cmds.values()), size)
 
     ###############################################
     # Methods that interact with stclc
@@ -264,40 +544,49 @@ class Dsync(object):
 
     def stclc_sitr_lookup(self, mod: str = "") -> str:
         """call stclc to do a sitr lookup to find new submits and return the response"""
-        return self.shell.run_command(f"sitr lookup -report script {mod}")
+        return self.shell.run_command(_sitr_lookup_cmd(mod))
 
     def stclc_puts_resp(self) -> str:
         """check the resp variable for the output from the prev command"""
-        return self.shell.run_command(
-            f'if [info exists resp] {{ puts $resp }} else {{ puts "ERROR" }}',
-            self.test_mode,
+        return self._run(
+            f'if [info exists resp] {{ puts $resp }} else {{ puts "ERROR" }}'
         )
 
-    def stclc_check_resp_error(self, msg: str) -> bool:
-        """check the response from a previous command and return True if there is an error"""
-        resp = self.stclc_puts_resp()
+    def stclc_check_resp_error(self, msg: str, resp: str = None) -> bool:
+        """check the response from a previous command (read back from stclc unless
+        given) and return True if there is an error"""
+        if resp is None:
+            resp = self.stclc_puts_resp()
         print(f"resp = {resp} for {msg}.")
         if resp == "ERROR":
             LOGGER.error(f"{msg}")
             return True
         status = parse_list_of_list_response(resp)
-        if len(status[1]) > 0:
+        if len(status) > 1 and len(status[1]) > 0:
             LOGGER.error(f"{msg} - {' '.join(status[1])}")
             return True
         return False
 
     def stclc_check_out(self, fname: str) -> bool:
         """check out files specified by string"""
-        self.stream_command(f"set resp [populate -lock {fname}]")
-        return self.stclc_check_resp_error(f"check out of {fname}")
+        resp = self.stream_command_resp(f"populate -lock {fname}")
+        return self.stclc_check_resp_error(f"check out of {fname}", resp)
 
     def stclc_check_in(
         self, files: str, comment: str = "", rec: bool = False, args: str = ""
     ) -> bool:
-        """check in files stored in a string"""
+        """check in files stored in a string, the comment must be provided by the
+        caller (the wtf script prompts for it)"""
         if not comment:
-            comment = input("Please provide a comment: ")
-        self.stream_command(f'ci -new {"-rec" if rec else ""} -comment "{comment}" {files}')
+            raise ValueError("A comment is required to check in files")
+        cmd = _join_args(
+            "ci -new",
+            "-rec" if rec else "",
+            f"-comment {_tcl_str(comment)}",
+            args,
+            files,
+        )
+        self.stream_command(cmd)
         # TODO - how to check if this command passes.
         #return self.stclc_check_resp_error(f"check in of {files}")
         return False
@@ -305,22 +594,18 @@ class Dsync(object):
         self, url: str = "", force: bool = False, rec: bool = True, args: str = ""
     ) -> bool:
         """run the populate command, print output, and return any errors"""
-        pop_args = f'{"-rec" if rec else ""} {"-force" if force else ""}'
-        self.stream_command(f"set resp [populate -rec {pop_args} {url} {args}]")
-        return self.stclc_check_resp_error(f"populate {url}")
+        resp = self.stream_command_resp(_populate_cmd(url, force, rec, args))
+        return self.stclc_check_resp_error(f"populate {url}", resp)
 
     def stclc_module_checkouts(self, module: str, filter: str = "") -> str:
         """scan for files that are checked out in the specified module"""
-        resp = self.shell.run_command(
-            f"set resp [ls -rec -workspace -locked -path -format list {filter} {module}]"
-        )
+        cmd = _join_args("ls", LS_LOCKED, filter, module)
+        resp = self.shell.run_command(f"set resp [{cmd}]")
         return self.stclc_puts_resp()
 
     def stclc_get_file_status(self, path: str) -> Dict:
         """return the design sync status of a single file"""
-        resp = self.shell.run_command(
-            f"set resp [ls -report status -format list {path}]", self.test_mode
-        )
+        resp = self._run(f"set resp [ls -report status -format list {path}]")
         files = parse_kv_response(self.stclc_puts_resp())
         if not files:
             return {}
@@ -328,30 +613,63 @@ class Dsync(object):
 
     def stclc_module_modified(self, module: str, filter: str = "") -> str:
         """scan for files that are modified in the specified module"""
-        resp = self.shell.run_command(
-            f"set resp [ls -rec -modified -path -format list {filter} {module}]"
-        )
+        cmd = _join_args("ls", LS_MODIFIED, filter, module)
+        resp = self.shell.run_command(f"set resp [{cmd}]")
         LOGGER.debug(f"show modified = {resp}")
         return self.stclc_puts_resp()
 
     def stclc_unmanaged(self, path: str, filter: str = "") -> str:
         """scan for files that are checked out in the specified module"""
+        cmd = _join_args("ls", LS_UNMANAGED, filter, path)
+        resp = self.shell.run_command(f"set resp [{cmd}]")
+        return self.stclc_puts_resp()
+
+    def stclc_multi_ls(self, paths: List[str], args: str) -> Dict[str, str]:
+        """run ls with the same switches on several modules/paths in a single stclc
+        command, return the list response for each path"""
+        return self.stclc_multi_scan(paths, {"ls": args})["ls"]
+
+    def stclc_multi_scan(
+        self, paths: List[str], scans: Dict[str, str]
+    ) -> Dict[str, Dict[str, str]]:
+        """run several ls scans (name -> switches) on several modules/paths in a
+        single stclc command, return the list responses of each scan by path.
+        A path whose scan failed is logged and left out of the responses"""
+        results = {name: {} for name in scans}
+        if not paths:
+            return results
+        # Each ls is caught so that a failing path does not abort the foreach
+        script = "; ".join(
+            f"if {{[catch {{ls {args} $path}} r]}} "
+            f'{{puts "<<<!{name} $path>>>"}} else {{puts "<<<{name} $path>>>"}}; '
+            f'puts $r; puts "<<<END>>>"'
+            for name, args in scans.items()
+        )
         resp = self.shell.run_command(
-            f"set resp [ls -unmanaged -rec -path -format list {filter} {path}]"
+            f"foreach path {{{' '.join(paths)}}} {{{script}}}"
         )
-        return self.stclc_puts_resp()
+        for key, value in _MULTI_LS_RE.findall(resp):
+            name, _, path = key.partition(" ")
+            if name.startswith("!"):
+                LOGGER.error(f"ls {path} - {value}")
+                continue
+            results[name][path] = value
+        return results
 
     def stclc_module_contents(self, module: str, tag: str = "", path="") -> str:
         """show the contents of the sitr module associated with the specified tag"""
-        args = f'{"-selector" if tag else ""} {tag} {"-path" if path else ""} {path}'
         return self.shell.run_command(
-            f"contents -modulecontext {module} -format list {args}"
+            _join_args(
+                f"contents -modulecontext {module} -format list",
+                f"-selector {tag}" if tag else "",
+                f"-path {path}" if path else "",
+            )
         )
 
     def stclc_tag_files(self, tag: str, path: str, args: str = "") -> str:
         """Tag the associated file/path with the specified tag"""
-        self.stream_command(f"set resp [tag {args} {tag} {path}]")
-        return self.stclc_check_resp_error(f"tag files {path}")
+        resp = self.stream_command_resp(_tag_files_cmd(tag, [path], args))
+        return self.stclc_check_resp_error(f"tag files {path}", resp)
 
     def stclc_module_locks(self, module: str) -> str:
         """show all of the locks in the specified module"""
@@ -373,22 +691,29 @@ class Dsync(object):
         """run the sitr status command to show the status of the workspace"""
         return self.shell.run_command(f"sitr status")
 
-    def stclc_update_module(self, module: str, config: str = "") -> str:
+    def stclc_update_module(self, module: str, config: str = "") -> bool:
         """update the specified module with the config/selector"""
-        args = f'{"-config" if config else ""} {config}'
-        self.stream_command(f"set resp [sitr update -config {config} {module}]")
-        resp = self.stclc_puts_resp()
-        if resp:
-            LOGGER.error(f"sitr update - {resp}")
-            return True
-        return False
+        return bool(self.stclc_update_modules({module: config}))
+
+    def stclc_update_modules(self, configs: Dict[str, str]) -> List[str]:
+        """update the modules with their config/selector (module -> config) in a
+        single stclc submission, return the modules that could not be updated"""
+        cmds = [_update_cmd(mod, config) for mod, config in configs.items()]
+        resps = self.stclc_batch(cmds)
+        self._sitr_modules = None
+        self._branch_cache = None
+        errors = []
+        for mod, resp in zip(configs, resps):
+            if resp:
+                LOGGER.error(f"sitr update {mod} - {resp}")
+                errors.append(mod)
+        return errors
 
     def stclc_populate_workspace(self, force: bool = False) -> bool:
         """populate the sitr workspace"""
-        self.stream_command(
-            f'set resp [sitr pop -skiplock {"-force" if force else ""}]'
-        )
-        resp = self.stclc_puts_resp()
+        cmd = _join_args("sitr pop -skiplock", "-force" if force else "")
+        resp = self.stream_command_resp(cmd)
+        self._sitr_modules = None
         if resp:
             LOGGER.error(f"sitr pop - {resp}")
             return True
@@ -408,51 +733,66 @@ class Dsync(object):
 
     def stclc_current_module(self) -> str:
         """return the module for the current working directory"""
-        resp = parse_kv_response(self.shell.run_command(f"showmods -format list"))
+        resp = parse_list_response(self.shell.run_command(f"showmods -format list"))
         return resp[-1]
 
     def stclc_make_mod(self, url: str, desc: str) -> bool:
-        """make the specified design sync module"""
-        if self.stclc_mod_exists(url):
+        """make the specified design sync module, the existence checks before and
+        after the mkmod are done in the same stclc command"""
+        mkmod = f"mkmod {url} -comment {_tcl_str(desc)}"
+        if self.test_mode:
+            # Only the mkmod is skipped, the existence check is run
+            status = "EXISTS" if self.stclc_mod_exists(url) else "CREATED"
+            if status == "CREATED":
+                self._skip_command(mkmod)
+        else:
+            resp = self._run(
+                f"if {{[url exists {url}]}} {{puts EXISTS}} else {{{mkmod}; "
+                f"if {{[url exists {url}]}} {{puts CREATED}} else {{puts FAILED}}}}"
+            )
+            status = resp.splitlines()[-1].strip() if resp else ""
+        if status == "CREATED":
+            return False
+        if status == "EXISTS":
             LOGGER.warn(f"The DSync module ({url}) already esists")
         else:
-            resp = self.stream_command(f'mkmod {url} -comment "{desc}"')
-            if self.stclc_mod_exists(f"{url}"):
-                return False
             LOGGER.error(f"The module {url} was not created")
         return True
 
     def stclc_add_mod(self, container: str, module: str, relpath: str) -> None:
         """add the dsync module to the specified container"""
-        resp = self.shell.run_command(
-            f"addhref {container} {module} -relpath {relpath}", self.test_mode
-        )
+        resp = self._run(_addhref_cmd(container, module, relpath))
         print(resp)
 
     def stclc_rm_mod(self, container: str, name: str) -> None:
         """remove the dsync module to the specified container"""
         # FIXME: BROKEN - copy/pasted from above
-        resp = self.shell.run_command(
-            f"rmhref {container} {name}", self.test_mode
-        )
+        resp = self._run(f"rmhref {container} {name}")
         print(resp)
 
     def stclc_make_sitr_mod(self, name: str, desc: str, no_cache: bool = False) -> None:
         """make the specified SITaR module"""
         args = " -nomcache" if no_cache else ""
-        if self.stclc_mod_exists(name):
-            LOGGER.warn(f"The SITaR module ({name}) already esists")
+        mkmod = f"sitr mkmod -name {name} -comment {_tcl_str(desc)}{args}"
+        if self.test_mode:
+            # Only the mkmod is skipped, the existence check is run
+            resp = "EXISTS" if self.stclc_mod_exists(name) else self._run(mkmod)
         else:
-            resp = self.shell.run_command(
-                f'sitr mkmod -name {name} -comment "{desc}" {args}', self.test_mode
+            resp = self._run(
+                f"if {{[url exists {name}]}} {{puts EXISTS}} else {{{mkmod}}}"
             )
+        if resp.strip() == "EXISTS":
+            LOGGER.warn(f"The SITaR module ({name}) already esists")
+        else:
             print(resp)
 
     def stclc_add_sitr_mod(self, module: str, release: str, relpath: str = "") -> bool:
         """add the sitr module to the root module"""
-        args = f'{"-relpath" if relpath else ""} {relpath}'
-        self.stream_command(f"set resp [sitr select {module}@{release} {args}]")
-        resp = self.stclc_puts_resp()
+        cmd = _join_args(
+            f"sitr select {module}@{release}", f"-relpath {relpath}" if relpath else ""
+        )
+        resp = self.stream_command_resp(cmd)
+        self._sitr_modules = None
         if resp:
             LOGGER.error(f"sitr select {resp}")
             return True
@@ -476,12 +816,15 @@ class Dsync(object):
 
         errors = {}
         vers = {}
-        args = f'{"-skipcheck" if skipcheck else ""}'
-        for mod in modules:
-            resp = self.shell.run_command(
-                f'set resp [sitr submit -force -comment "{comment}" {args} {mod}]'
-            )
-
+        args = _join_args(
+            f"-comment {_tcl_str(comment)}", "-skipcheck" if skipcheck else ""
+        )
+        cmds = [f"set resp [sitr submit -force {args} {mod}]" for mod in modules]
+        if self.test_mode:
+            resps = [self._run(cmd) for cmd in cmds]
+        else:
+            resps = self.run_parallel(cmds)
+        for mod, resp in zip(modules, resps):
             if resp:
                 errors[mod] = resp
                 vers[mod] = resp.partition("Tagging:")[-1]
@@ -507,10 +850,9 @@ class Dsync(object):
 
     def stclc_integrate(self, nopop: bool = False, email=None) -> bool:
         """run the sitr integrate command"""
-        self.stream_command(
-            f'set resp [sitr integrate -noprompt {"-nopop" if nopop else ""}]'
-        )
-        resp = self.stclc_puts_resp()
+        cmd = _join_args("sitr integrate -noprompt", "-nopop" if nopop else "")
+        resp = self.stream_command_resp(cmd)
+        self._sitr_modules = None
         if resp:
             LOGGER.error(f"integrate {resp}")
             if email is not None:
@@ -521,7 +863,7 @@ class Dsync(object):
 
     def stclc_compare(self, args: str = "", args2: str = "") -> None:
         """run the compare command"""
-        self.stream_command(f"compare {args} {args2}")
+        self.stream_command(_compare_cmd(args, args2))
 
     def email_command_output(self, email: str, command: str, content: str):
         self.send_email(
@@ -539,9 +881,9 @@ class Dsync(object):
         email=None,
     ) -> bool:
         """run the sitr release command"""
-        args = f'{"-skipcheck" if skip_check else ""} {"-_fromserver" if on_server else ""}'
-        self.stream_command(f'set resp [sitr release -comment "{comment}" {args}]')
-        resp = self.stclc_puts_resp()
+        args = _RELEASE_ARGS[skip_check | on_server << 1]
+        cmd = _join_args(f"sitr release -comment {_tcl_str(comment)}", args)
+        resp = self.stream_command_resp(cmd)
         if resp:
             LOGGER.error(f"release {resp}")
             if email is not None:
@@ -563,10 +905,9 @@ class Dsync(object):
         return self.shell.run_command(f"url vault {module}")
 
     def stclc_create_branch(self, url: str, version: str, comment: str) -> bool:
-        self.stream_command(
-            f'set resp [sitr mkbranch -comment "{comment}" {version} {url}]'
+        resp = self.stream_command_resp(
+            f"sitr mkbranch -comment {_tcl_str(comment)} {version} {url}"
         )
-        resp = self.stclc_puts_resp()
         if resp:
             LOGGER.error(f"create branch {resp}")
             return True
@@ -574,9 +915,61 @@ class Dsync(object):
 
     def stream_command(self, cmd: str) -> None:
         """stream the specified command"""
-        for resp in self.shell.stream_command(cmd, self.test_mode):
+        for resp in self._stream(cmd):
             print(f"{resp}", end="")
 
+    def stclc_pipeline(self, cmds: List[str]) -> List[str]:
+        """send the commands to stclc without waiting for each response in turn,
+        return the responses in order. Only used for lookups, which are also run
+        in test mode"""
+        with self.shell.pipeline() as ring:
+            futures = [ring.submit(cmd) for cmd in cmds]
+            return [future.result(self.shell.timeout) for future in futures]
+
+    def stream_command_resp(self, cmd: str) -> str:
+        """stream the specified command and return its result (see stclc_batch)"""
+        return self.stclc_batch([cmd])[0]
+
+    def stclc_batch(self, cmds: List[Union[str, LinkedCmd]]) -> List[str]:
+        """stream several commands in a single stclc submission and return the
+        result of each command, ERROR if it failed. The results are printed
+        between markers in the same submission so they do not need to be read
+        back with separate commands. The steps of a LinkedCmd are run in the same
+        catch, so the first failing step aborts the rest of the chain"""
+        if not cmds:
+            return []
+        script = "; ".join(
+            f"if {{[catch {{{_link_steps(cmd)}}} resp]}} "
+            f"{{puts $resp; set resp ERROR}}; "
+            f'puts "{_RESP_BEGIN}"; puts $resp; puts "{_RESP_END}"'
+            for cmd in cmds
+        )
+        results = []
+        resp = None
+        for line in self._stream(script):
+            text = line.rstrip()
+            # A command may leave its last output line open (puts -nonewline)
+            if text.endswith(_RESP_BEGIN):
+                if text != _RESP_BEGIN:
+                    print(text[: -len(_RESP_BEGIN)])
+                resp = []
+            elif resp is not None and text.endswith(_RESP_END):
+                resp.append(text[: -len(_RESP_END)])
+                results.append("".join(resp).strip())
+                resp = None
+            elif resp is not None:
+                resp.append(line)
+            else:
+                print(f"{line}", end="")
+        missing = len(cmds) - len(results)
+        if missing and self.test_mode:
+            # Nothing is returned in test mode
+            results += [""] * missing
+        elif missing:
+            LOGGER.error(f"No result was returned for {missing} of the commands")
+            results += ["ERROR"] * missing
+        return results
+
     ###############################################
     # Methods that do not interact with stclc
     ###############################################
@@ -606,10 +999,12 @@ class Dsync(object):
     def force_integrate_mode(self) -> None:
         """set the environment variable to run in Interator mode"""
         self.shell.env["SYNC_DEV_ASSIGNMENT"] = "Integrate"
+        self.reset_caches()
 
     def force_version(self, version: str) -> None:
         """set the baseline version of the workspace"""
         self.stclc_set_sitr_alias(version)
+        self.reset_caches()
 
     def get_sitr_project_dir(self, sitr_env: Dict) -> "Path":
         """Get the root SITaR project directory"""
@@ -622,7 +1017,7 @@ class Dsync(object):
 
     def get_hrefs(self, url: str) -> List[Dict]:
         """return a list of the different hrefs, each item is a dict with attributes"""
-        return parse_kv_response(self.stclc_get_hrefs(url))
+        return parse_list_response(self.stclc_get_hrefs(url))
 
     # def show_hrefs(self, url: str, submodule="") -> None:
     #    """Show the hrefs for the specified URL"""
@@ -732,16 +1127,20 @@ class Dsync(object):
             LOGGER.error(f"Unsupported file type ({fname})")
             return 1
 
-        for container in df["submodule"].unique():
+        # Split the rows by container in a single pass (in order of appearance)
+        for container, rows in df.groupby("submodule", sort=False):
             if submodule and container != submodule:
                 continue
             print(f"Checking the Hrefs for {container}")
             container_hrefs = self.get_hrefs(container)
+            by_url = {h["url"]: h for h in container_hrefs}
+            by_path = {h["relpath"]: h for h in container_hrefs}
             updates = []
-            for index, href in df[df["submodule"] == container].iterrows():
+            for index, href in rows.iterrows():
                 if self.add_href(
                     container,
-                    container_hrefs,
+                    by_url,
+                    by_path,
                     href["url"],
                     href["relpath"],
                     href["selector"],
@@ -755,7 +1154,8 @@ class Dsync(object):
                 for href in updates:
                     self.add_href(
                         container,
-                        container_hrefs,
+                        by_url,
+                        by_path,
                         href["url"],
                         href["relpath"],
                         href["selector"]
@@ -766,13 +1166,15 @@ class Dsync(object):
     def add_href(
         self,
         container: str,
-        hrefs: List[Dict],
+        by_url: Dict[str, Dict],
+        by_path: Dict[str, Dict],
         url: str,
         relpath: str,
         selector: str = "",
         test_flag: bool = False,
     ) -> bool:
-        """add the href to the specific container"""
+        """add the href to the specific container, the existing hrefs of the
+        container are passed in indexed by url and by relpath"""
         if selector:
             full_url = f"{url}@{selector}"
         else:
@@ -780,24 +1182,25 @@ class Dsync(object):
         if not self.stclc_mod_exists(f"{full_url}"):
             LOGGER.warn(f"The Href {full_url} does not exist")
             return False
-        for href in hrefs:
-            if url == href["url"]:
-                if selector == href["selector"]:
-                    # LOGGER.warn(f"The Href {href['url']}@{href['selector']} is already present")
-                    return False
-                elif test_flag:
-                    LOGGER.info(
-                        f"Updating the Href {href['url']} selector from {href['selector']} to {selector if selector else 'Trunk:'}"
-                    )
-                else:
-                    self.stclc_rm_mod(container, href["name"])
-            elif relpath == href["relpath"]:
-                if test_flag:
-                    LOGGER.info(
-                        f"Updating the Href at {href['relpath']} from {href['url']} to {url}"
-                    )
-                else:
-                    self.stclc_rm_mod(container, href["name"])
+        href = by_url.get(url)
+        if href:
+            if selector == href["selector"]:
+                # LOGGER.warn(f"The Href {href['url']}@{href['selector']} is already present")
+                return False
+            elif test_flag:
+                LOGGER.info(
+                    f"Updating the Href {href['url']} selector from {href['selector']} to {selector if selector else 'Trunk:'}"
+                )
+            else:
+                self.stclc_rm_mod(container, href["name"])
+        href = by_path.get(relpath)
+        if href and href["url"] != url:
+            if test_flag:
+                LOGGER.info(
+                    f"Updating the Href at {href['relpath']} from {href['url']} to {url}"
+                )
+            else:
+                self.stclc_rm_mod(container, href["name"])
         if test_flag:
             LOGGER.info(f"Adding the new Href {full_url}")
         else:
@@ -818,12 +1221,17 @@ class Dsync(object):
         self, sitr_mods: List[Dict], modules: List[str], tag: str, force: bool = False
     ) -> bool:
         """populate the specified tag in all modules in update mode"""
-        errors = []
-        for mod in modules:
-            path = sitr_mods[mod]["relpath"]
-            args = f"-version {tag} -dir {path}"
-            if self.stclc_populate(force=force, args=args):
-                errors.append(mod)
+        cmds = [
+            _populate_cmd(
+                force=force, args=f"-version {tag} -dir {sitr_mods[mod]['relpath']}"
+            )
+            for mod in modules
+        ]
+        errors = [
+            mod
+            for mod, resp in zip(modules, self.stclc_batch(cmds))
+            if self.stclc_check_resp_error(f"populate {mod}", resp)
+        ]
         if errors:
             LOGGER.warn(
                 f"Errors encountered when populating {' '.join(errors)} with the tag {tag}"
@@ -832,17 +1240,20 @@ class Dsync(object):
         return False
 
     def populate_configs(
-        self, sitr_mods: List[Dict], config_list: List[str], force: bool = False
+        self,
+        sitr_mods: List[Dict],
+        config_list: Dict[str, Dict],
+        force: bool = False,
     ) -> bool:
         """populate a specified list of module configs if modules are not in update mode"""
-        errors = []
+        configs = {}
         for mod in sitr_mods:
             if sitr_mods[mod]["status"] == "Update":
                 continue
-            if not mod in config_list:
+            if mod not in config_list:
                 continue
-            if self.stclc_update_module(mod, config_list[mod]["tagName"]):
-                errors.append(mod)
+            configs[mod] = config_list[mod]["tagName"]
+        errors = self.stclc_update_modules(configs)
         if errors:
             LOGGER.warn(f"Errors encountered when updating {' '.join(errors)}")
             return True
@@ -874,7 +1285,13 @@ class Dsync(object):
 
     def get_root_url(self, module: str = "", version: str = "") -> str:
         """Create a branch of the specified module (will be top if not specified)"""
-        root = self.stclc_get_url_root(module)
+        if module:
+            root = self.stclc_get_url_root(module)
+        else:
+            # The vault of the top module is looked up once per workspace
+            if self._top_vault is None:
+                self._top_vault = self.stclc_get_url_root()
+            root = self._top_vault
         if version:
             return f"{root}@{version}:"
         else:
@@ -882,6 +1299,7 @@ class Dsync(object):
 
     def create_branch(self, version: str, module_tag: str, comment: str) -> bool:
         """Create a branch of the current top module"""
+        self._branch_cache = None
         url = self.get_root_url(version=version)
         if self.stclc_mod_exists(url):
             LOGGER.warn(f"The DSync module ({url}) already esists")
@@ -889,18 +1307,22 @@ class Dsync(object):
         if self.stclc_create_branch(
             f'{os.environ["SYNC_DEVAREA_TOP"]}%0', version, comment
         ):
-            return True
-        if not self.stclc_mod_exists(url):
-            # TODO - raise exception?
-            LOGGER.error(f"could not create the sitr module ({url})")
+            # Only check the module when mkbranch failed, to report the cause
+            if not self.stclc_mod_exists(url):
+                # TODO - raise exception?
+                LOGGER.error(f"could not create the sitr module ({url})")
             return True
         if self.stclc_tag_files(module_tag, url):
             return True
         return False
 
     def branch_modules(
-        self, sitr_mods: List[Dict], mod_list: List[str], version: str, comment: str
-    ) -> True:
+        self,
+        sitr_mods: List[Dict],
+        mod_list: Dict[str, Dict],
+        version: str,
+        comment: str,
+    ) -> Dict:
         """branch all of the modules with the versions specified by mod_list"""
         branches = []
         errors = False
@@ -909,21 +1331,26 @@ class Dsync(object):
             if mod not in mod_list:
                 LOGGER.error(f"The module {mod} is not in the module list")
                 errors = True
-            branches.append({"module": mod["module"], "version": mod["tagName"]})
+                continue
+            branches.append({"module": mod, "version": mod_list[mod]["tagName"]})
         if errors:
             return {}
 
+        # The vault lookups and existence checks are pipelined to stclc
+        roots = self.stclc_pipeline([f"url vault {b['module']}" for b in branches])
         mod_list = {}
-        for branch in branches:
-            url = self.get_root_url(module=branch["module"], version=branch["version"])
-            branched_url = self.get_root_url(
-                module=branch["module"], version=f"{version}_v1.1"
-            )
+        branched_urls = []
+        for branch, root in zip(branches, roots):
+            url = f"{root}@{branch['version']}:"
             if self.stclc_create_branch(url, version, comment):
                 errors = True
-            if not self.stclc_mod_exists(branched_url):
-                LOGGER.error(f"could not create the sitr module ({branched_url})")
+            branched_urls.append(f"{root}@{version}_v1.1:")
+            mod = branch["module"]
             mod_list[mod] = {"module": mod, "tagName": f"{version}_v1.1"}
+        resps = self.stclc_pipeline([f"url exists {url}" for url in branched_urls])
+        for branched_url, resp in zip(branched_urls, resps):
+            if not resp.lstrip().startswith("1"):
+                LOGGER.error(f"could not create the sitr module ({branched_url})")
         if errors:
             return {}
         return mod_list
@@ -938,27 +1365,26 @@ class Dsync(object):
 
     def get_module_checkouts(self, module: str, filter: str = "") -> List[Dict]:
         """get a list of files that are checked out in the specified module"""
-        resp = self.stclc_module_checkouts(module, filter)
-        resp = parse_kv_response(resp)
-        if resp:
-            return get_files(resp[0])
-        return []
+        return get_list_files(self.stclc_module_checkouts(module, filter))
+
+    def scan_submit_files(
+        self, modules: List[str], filter: str = ""
+    ) -> Dict[str, Dict[str, str]]:
+        """scan all of the modules for checkouts (locked) and modified files with a
+        single stclc command, the responses are only parsed when they are used"""
+        scans = {
+            "locked": _join_args(LS_LOCKED, filter),
+            "modified": _join_args(LS_MODIFIED, filter),
+        }
+        return self.stclc_multi_scan(modules, scans)
 
     def get_module_modified(self, module: str, filter: str = "") -> List[Dict]:
         """get a list of files that are modified in the specified module"""
-        resp = self.stclc_module_modified(module, filter)
-        resp = parse_kv_response(resp)
-        if resp:
-            return get_files(resp[0])
-        return []
+        return get_list_files(self.stclc_module_modified(module, filter))
 
     def get_unmanaged(self, path: str, filter: str = "") -> List[Dict]:
         """get a list of files that are modified in the specified module"""
-        resp = self.stclc_unmanaged(path, filter)
-        resp = parse_kv_response(resp)
-        if resp:
-            return get_files(resp[0])
-        return []
+        return get_list_files(self.stclc_unmanaged(path, filter))
 
     def compare(
         self,
@@ -969,32 +1395,32 @@ class Dsync(object):
         is_baseline: bool,
     ) -> None:
         """Run the compare on the specified modules, vs trunk or tag or baseline"""
-        args = "-rec -path"
+        parts = ["-rec", "-path"]
         select = "selector"
         if tag:
-            args += f" -{select} {tag}"
+            parts += [f"-{select}", tag]
             select = "selector2"
         if is_trunk:
-            branch = self.stclc_get_branch()
+            branch = self.get_branch()
             if not branch.endswith(":"):
                 branch += ":"
-            args += f" -{select} {branch}"
+            parts += [f"-{select}", branch]
             select = "selector2"
+        args = " ".join(parts)
+        # The compares are independent, run them on a pool of shells
+        cmds = {}
         for mod in modules:
-            args2 = ""
             if sitr_mods[mod]["status"] != "Update":
                 print(f"Skipping {mod} since it is not in update mode")
                 continue
-            if is_baseline:
-                args2 = f'-{select} {sitr_mods[mod]["baseline"]}'
-            args2 += f" {mod}"
-            print(f"Scanning {mod}")
-            self.stclc_compare(args, args2)
+            baseline = f'-{select} {sitr_mods[mod]["baseline"]}' if is_baseline else ""
+            cmds[f"Scanning {mod}"] = _compare_cmd(args, _join_args(baseline, mod))
+        self.stream_parallel(cmds)
 
     def check_tag(self, sitr_mods: List[Dict], modules: List[str], tag: str) -> None:
         """Check the specified tag and display the versions of the files that were tagged"""
         if not tag:
-            tag = self.stclc_get_branch()
+            tag = self.get_branch()
             # get branch returns a selector which must end with :
             if not tag.endswith(":"):
                 tag += ":"
@@ -1005,9 +1431,8 @@ class Dsync(object):
             print(f"Scanning {mod}")
             path = sitr_mods[mod]["relpath"]
             resp = self.stclc_module_contents(mod, tag, path)
-            parsed = parse_kv_response(
-                "\n".join(resp.splitlines()[1:-1])
-            )  # skip first/last line
+            # skip first/last line
+            parsed = parse_kv_response(resp.partition("\n")[2].rpartition("\n")[0])
             if not parsed:
                 print(f"No matching files for {tag}")
                 continue
@@ -1023,7 +1448,7 @@ class Dsync(object):
         for mod in modules:
             print(f"Scanning {mod}")
             resp = self.stclc_module_locks(mod)
-            parsed = parse_kv_response(resp)
+            parsed = parse_list_response(resp)
             if not parsed or not "contents" in parsed[0]:
                 print(f"No checkouts")
                 continue
@@ -1033,18 +1458,27 @@ class Dsync(object):
                 table[header] = [item[header] for item in parsed[0]["contents"]]
             print(tabulate.tabulate(table, headers="keys", tablefmt="psql"))
 
-    def get_sitr_modules(self) -> Dict:
-        """return the SITaR modules and their status"""
+    def get_branch(self, refresh: bool = False) -> str:
+        """return the branch of the workspace, the result of stclc_get_branch is
+        cached until the workspace configuration changes or refresh is set"""
+        if self._branch_cache is None or refresh:
+            self._branch_cache = self.stclc_get_branch()
+        return self._branch_cache
+
+    def get_sitr_modules(self, refresh: bool = False) -> Dict:
+        """return the SITaR modules and their status, the result of the sitr status
+        is cached until a command changes the modules or refresh is set"""
+        if self._sitr_modules is not None and not refresh:
+            return self._sitr_modules
         modules = {}
-        keys = ["selector", "baseline", "relpath", "status"]
         resp = self.stclc_sitr_status()
-        for line in resp.split("\n"):
+        for line in io.StringIO(resp):
             if not line.startswith(" "):
                 continue
             items = line.split()
-            first_item = next(iter(items), "")
-            if "%" in first_item:
-                modules[first_item[:-2]] = dict(zip(keys, items[1:]))
+            if items and "%" in items[0]:
+                modules[items[0][:-2]] = dict(zip(_SITR_STATUS_KEYS, items[1:]))
+        self._sitr_modules = modules
         return modules
 
     def vhistory(self, modules: List[str]) -> None:
@@ -1066,14 +1500,11 @@ class Dsync(object):
         """put the modules specified into update mode"""
         if not config:
             # Discover config version from the workspace
-            config = self.stclc_get_branch()
+            config = self.get_branch()
             if not config.endswith(":"):
                 # Suffix : seems to matter
                 config += ":"
-        errors = []
-        for mod in modules:
-            if self.stclc_update_module(mod, config):
-                errors.append(mod)
+        errors = self.stclc_update_modules({mod: config for mod in modules})
         if errors:
             LOGGER.warn(
                 f"Errors encountered when updating {' '.join(errors)} with the config {config}"
@@ -1094,9 +1525,13 @@ class Dsync(object):
 
     def show_checkouts(self, modules: List[str]) -> None:
         """Display a list of the files checked out in the specified modules"""
+        responses = self.stclc_multi_ls(modules, LS_LOCKED)
         for mod in modules:
             print(f"Scanning {mod}")
-            files = self.get_module_checkouts(mod)
+            if mod not in responses:
+                LOGGER.error(f"The checkouts of {mod} could not be listed")
+                continue
+            files = get_list_files(responses[mod])
             if not files:
                 print(f"No checkouts")
                 continue
@@ -1130,10 +1565,14 @@ class Dsync(object):
 
     def show_unmanaged(self, sitr_mods: List[Dict], modules: List[str]) -> None:
         """check the unmanaged files in the module and display the files"""
+        paths = {mod: sitr_mods[mod]["relpath"] for mod in modules}
+        responses = self.stclc_multi_ls(list(paths.values()), LS_UNMANAGED)
         for mod in modules:
             print(f"Scanning {mod}")
-            path = sitr_mods[mod]["relpath"]
-            files = self.get_unmanaged(path)
+            if paths[mod] not in responses:
+                LOGGER.error(f"The unmanaged files of {mod} could not be listed")
+                continue
+            files = get_list_files(responses[paths[mod]])
             if files:
                 LOGGER.warn(f"The module {mod} has the following unmanaged files")
                 self.display_mod_files(files)
@@ -1141,23 +1580,30 @@ class Dsync(object):
 
     def tag_sch_sym(self, sitr_mods: List[Dict], modules: List[str], tag: str) -> bool:
         """Check to make sure that all sch/sym are checked in, then tag them with the provided tag"""
-        args = "-rec -filter +.../schematic.sync.cds,+.../symbol.sync.cds"
+        filter = "-filter +.../schematic.sync.cds,+.../symbol.sync.cds"
+        args = f"-rec {filter}"
         errors = []
+        scans = self.scan_submit_files(modules, filter)
+        # The module paths are relative to the workspace root
+        self.shell.run_command("cdws")
         for mod in modules:
-            files = self.get_module_checkouts(mod, filter)
+            if not all(mod in scan for scan in scans.values()):
+                LOGGER.error(f"The module {mod} could not be scanned")
+                errors.append(mod)
+                continue
+            files = get_list_files(scans["locked"][mod])
             LOGGER.debug(f"results from show checkouts = {files}")
             if files:
                 LOGGER.warn(f"The module {mod} has checkouts and cannot be tagged")
                 self.display_mod_files(files)
                 continue
-            files = self.get_module_modified(mod, filter)
+            files = get_list_files(scans["modified"][mod])
             LOGGER.debug(f"results from show modified = {files}")
             if files:
                 LOGGER.warn(f"The module {mod} has modified files and cannot be tagged")
                 self.display_mod_files(files)
                 continue
             path = sitr_mods[mod]["relpath"]
-            resp = self.shell.run_command(f"cdws")
             print(f"Tagging {mod} with {tag}")
             if self.stclc_tag_files(tag, path, args=args):
                 errors.append(mod)
@@ -1168,36 +1614,52 @@ class Dsync(object):
             return True
         return False
 
-    def snapshot_add_submodules(
+    def snapshot_submodule_cmds(
         self, tag: str, mod: str, hrefs: List[Dict], args: str = ""
-    ) -> bool:
-        """for all of the hrefs, add the snapshot version to the snapshot version of the module"""
+    ) -> Tuple[List[Union[str, LinkedCmd]], bool]:
+        """return the stclc commands adding the snapshot version of the hrefs to the
+        snapshot version of the module, and True if an href could not be handled.
+        Each href is a separate command, a Module href is only added once its
+        snapshot version is tagged"""
+        container = f"[url vault {mod}]\\;{tag}"
+        cmds = []
         status = False
         for href in hrefs:
             if href["type"] == "Module":
-                if self.stclc_tag_files(tag, f"{href['name']}%0", args=args):
-                    status = True
-                else:
-                    self.stclc_add_mod(
-                        f"[url vault {mod}]\;{tag}",
-                        f"{href['url']}\;{tag}",
-                        href["relpath"],
+                cmds.append(
+                    LinkedCmd(
+                        [
+                            _tag_cmd(tag, f"{href['name']}%0", args),
+                            _addhref_cmd(
+                                container, f"{href['url']}\\;{tag}", href["relpath"]
+                            ),
+                        ]
                     )
+                )
             elif href["type"] == "Branch":
                 url = href["url"]
                 if href["selector"]:
                     url += f"@{href['selector']}"
-                self.stclc_add_mod(f"[url vault {mod}]\;{tag}", url, href["relpath"])
+                cmds.append(_addhref_cmd(container, url, href["relpath"]))
             else:
                 LOGGER.error(
                     f"Unknown href type for {mod}->{href['url']} ({href['type']})"
                 )
                 status = True
+        return cmds, status
+
+    def snapshot_add_submodules(
+        self, tag: str, mod: str, hrefs: List[Dict], args: str = ""
+    ) -> bool:
+        """for all of the hrefs, add the snapshot version to the snapshot version of the module"""
+        cmds, status = self.snapshot_submodule_cmds(tag, mod, hrefs, args)
+        if "ERROR" in self.stclc_batch(cmds):
+            status = True
         return status
 
     def get_snapshot_tagname(self, tag: str) -> str:
         # Check what branch we're on
-        branch = self.stclc_get_branch()
+        branch = self.get_branch()
         # On trunk, add REL_ prefix to the tag, otherwise add
         # uppercased branch + "_" as prefix to the tag.
         snap_tag = (
@@ -1207,23 +1669,30 @@ class Dsync(object):
 
     def check_for_submit_errors(self, modules: List[str]) -> bool:
         """check modules for erros that would prevent the submit"""
-        errors = set()
-        for mod in modules:
-            files = self.get_module_checkouts(mod)
+        # One error flag per module, reported in the order of the modules
+        errbits = bytearray(len(modules))
+        scans = self.scan_submit_files(modules)
+        for idx, mod in enumerate(modules):
+            if not all(mod in scan for scan in scans.values()):
+                LOGGER.error(f"The module {mod} could not be scanned")
+                errbits[idx] = 1
+                continue
+            files = get_list_files(scans["locked"][mod])
             LOGGER.debug(f"results from show checkouts = {files}")
             if files:
                 LOGGER.warn(f"The module {mod} has checkouts and cannot be submitted")
                 self.display_mod_files(files)
-                errors.add(mod)
+                errbits[idx] = 1
                 continue
-            files = self.get_module_modified(mod)
+            files = get_list_files(scans["modified"][mod])
             LOGGER.debug(f"results from show modified = {files}")
             if files:
                 LOGGER.warn(
                     f"The module {mod} has modified files and cannot be submitted"
                 )
                 self.display_mod_files(files)
-                errors.add(mod)
+                errbits[idx] = 1
+        errors = [mod for mod, err in zip(modules, errbits) if err]
         if errors:
             LOGGER.warn(
                 f"Errors encountered when submitting the {' '.join(errors)} modules"
@@ -1241,24 +1710,42 @@ class Dsync(object):
     ) -> bool:
         """perform the snapshot submit on the specified modules with the specified tag"""
         snap_tag_base = self.get_snapshot_tagname(tag)
-        errors = set()
-        for mod in modules:
+        # One error flag per module, reported in the order of the modules
+        errbits = bytearray(len(modules))
+        # The hrefs of all of the modules are pipelined to stclc
+        resps = self.stclc_pipeline(
+            [f"showhrefs -rec -format list {mod}" for mod in modules]
+        )
+        # The submodules of a module are only handled once the module is tagged, each
+        # in its own catch, and all of the modules are sent in one submission
+        linked = []
+        # TODO - need to check if this tag exists, then the tag should be _v1.2
+        snap_tag = snap_tag_base + "_v1.1"
+        base_args = f"-rec -immutable -comment {_tcl_str(comment)}"
+        for idx, (mod, resp) in enumerate(zip(modules, resps)):
             print(f"Performing the snapshot submit on {mod} with {snap_tag_base}")
-            # TODO - need to check if this tag exists, then the tag should be _v1.2
-            snap_tag = snap_tag_base + "_v1.1"
             LOGGER.debug(f"Using snapshot tag {snap_tag} for module {mod}")
             path = sitr_mods[mod]["relpath"]
             selector = sitr_mods[mod]["selector"]
-            args = "-rec -immutable -comment {comment}"
-            hrefs = self.get_hrefs(mod)
+            args = base_args
+            hrefs = parse_list_response(resp)
             if hrefs:
-                args += f" -filter {','.join([x['relpath'] for x in hrefs])}"
-            if self.stclc_tag_files(snap_tag, path, args=args):
+                args += f" -filter {','.join(x['relpath'] for x in hrefs)}"
+            cmds, status = self.snapshot_submodule_cmds(
+                snap_tag, mod, hrefs, args="-immutable"
+            )
+            if status:
                 # TODO - raise exception?
-                errors.add(mod)
-            elif self.snapshot_add_submodules(snap_tag, mod, hrefs, args="-immutable"):
+                errbits[idx] = 1
+            steps = [_tag_cmd(snap_tag, path, args)]
+            if cmds:
+                steps.append(_catch_each(cmds))
+            linked.append(LinkedCmd(steps))
+        for idx, resp in enumerate(self.stclc_batch(linked)):
+            if resp == "ERROR":
                 # TODO - raise exception?
-                errors.add(mod)
+                errbits[idx] = 1
+        errors = [mod for mod, err in zip(modules, errbits) if err]
 
         if email is not None:
             resp = f"\nUsed arguments:\nmodules={','.join(modules)}\ntag={tag}\ncomment={comment}\n"
@@ -1295,25 +1782,33 @@ class Dsync(object):
                         readme = ""
             else:
                 readme = ""
+            files = [
+                str(file)
+                for file in (
+                    readme,
+                    path / "design_libs/cds.lib.design_lib",
+                    path / "sim_libs/cds.lib.sim_libs",
+                )
+                if file and file.exists()
+            ]
+            # The files are tagged with one command, sent with the CONFIG tag
+            tag_cmds = {}
             if mod == "CONFIG":
-                self.stclc_tag_files(tag, path, args="-rec -modified")
-            if readme:
-                self.stclc_tag_files(tag, str(readme), "-modified")
-            cds_lib = Path(path) / "design_libs/cds.lib.design_lib"
-            if cds_lib.exists():
-                self.stclc_tag_files(tag, str(cds_lib), "-modified")
-            cds_lib = Path(path) / "sim_libs/cds.lib.sim_libs"
-            if cds_lib.exists():
-                self.stclc_tag_files(tag, str(cds_lib), "-modified")
+                tag_cmds[str(path)] = _tag_files_cmd(tag, [str(path)], "-rec -modified")
+            if files:
+                tag_cmds[" ".join(files)] = _tag_files_cmd(tag, files, "-modified")
+            for paths, resp in zip(tag_cmds, self.stclc_batch(list(tag_cmds.values()))):
+                self.stclc_check_resp_error(f"tag files {paths}", resp)
             hrefs = self.get_hrefs(mod)
             self.snapshot_add_submodules(tag, mod, hrefs)
     def get_ws_devname(self) -> str:
-        config = self.stclc_get_branch()
+        config = self.get_branch()
         if config == "Trunk":
             config = "v100"
         return f'{os.environ["SYNC_DEVAREA_TOP"]}_{config}'.lower()
     def get_tapeout_tag(self) -> str:
-        return f'tapeout_{self.get_ws_devname()}'.lower()
+        # get_ws_devname is already lower case
+        return f"tapeout_{self.get_ws_devname()}"
     def setup_tapeout_ws(self, sitr_mods: List[Dict], tag: str) -> bool:
         """put all of the modules into update mode with the tapeout selector"""
         errors = []
@@ -1339,11 +1834,11 @@ class Dsync(object):
     def setup_shared_ws(self, sitr_mods: List[Dict]) -> bool:
         """put all of the modules into update mode"""
         # Discover config version from the workspace
-        config = self.stclc_get_branch()
+        config = self.get_branch()
         if not config.endswith(":"):
             # Suffix : seems to matter
             config += ":"
-        errors = []
+        modules = []
         for mod in sitr_mods:
             if sitr_mods[mod]["status"] != "Update":
                 LOGGER.warn(f"The {mod} module is not in Update mode")
@@ -1355,8 +1850,8 @@ class Dsync(object):
                 )
             else:
                 continue
-            if self.update_module([mod]):
-                errors.append(mod)
+            modules.append(mod)
+        errors = self.stclc_update_modules({mod: config for mod in modules})
         if errors:
             LOGGER.warn(
                 f"Errors encountered when updating the {' '.join(errors)} modules"
@@ -1409,22 +1904,21 @@ class Dsync(object):
         """get a list of submits that are ready to integrate"""
         if not modules:
             modules = [""]
-        resp_list = []
         for mod in modules:
             print(f"Scanning {mod}")
-            resp = self.stclc_sitr_lookup(mod)
-            resp_list.append(resp)
+        # The lookups are independent, run them on a pool of shells
+        resp_list = self.run_parallel([_sitr_lookup_cmd(mod) for mod in modules])
         return self.process_sitr_update_list(resp_list)
 
     def process_sitr_update_list(self, resp_list: List[str]) -> List:
         """get a list of newly submitted modules that can be integrated"""
-        resp_str = " ".join([resp.split("\n")[0] for resp in resp_list])
+        resp_str = " ".join(resp.partition("\n")[0] for resp in resp_list)
         # TODO - need to support the all switch with multiple submits
         update_list = {}
         kv_resp = parse_kv_response(f"{resp_str}")
         for url, settings in kv_resp.items():
             (base_url, selector) = url.split("@")
-            if re.search(r"v\d\.\d+$", selector):
+            if _VER_RE.search(selector):
                 root_mod = base_url.split("/")[-1]
                 new_item = settings
                 new_item["module"] = root_mod
@@ -1459,15 +1953,15 @@ class Dsync(object):
         errors = []
         if mod_list:
             # Check what branch we're on
-            branch = self.stclc_get_branch()
+            branch = self.get_branch()
             # Only allow tags with certain prefixes, based on the branch
             # TODO - this filter needs to be in lookup not integrate
             is_trunk = "trunk" in branch.lower()
-            allowed_prefixes = ["REL_", "v1."] if is_trunk else [branch]
+            allowed_prefixes = ("REL_", "v1.") if is_trunk else (branch,)
             for module, mod in mod_list.items():
                 module_name = mod["module"]
                 module_tag = mod["tagName"]
-                if not any(module_tag.startswith(p) for p in allowed_prefixes):
+                if not module_tag.startswith(allowed_prefixes):
                     LOGGER.warning(
                         f"Ignoring not allowed tag {module_tag} for module {module_name} on selector {branch}"
                     )
@@ -1513,9 +2007,8 @@ class Dsync(object):
         report = []
         for mod in modules:
             resp = self.stclc_module_status(mod)
-            report.extend(
-                list(filter(None, map(str.strip, resp.splitlines())))[:-1]
-            )  # skip prompt
+            lines = resp.splitlines()[:-1]  # skip prompt
+            report.extend(line for line in map(str.strip, lines) if line)
         last_mod = ""
         errors = []
         for line in report:
@@ -1549,22 +2042,12 @@ class Dsync(object):
         Parses given project.xml file and extracts the value of `key` attribute from
         top-level element `section` -> `<values>`.
         """
-        if not fname.exists():
-            LOGGER.error("%s NOT found", str(fname))
-            return ""
-
-        et = ET()
-        doc = et.parse(str(fname))
-
         try:
-            section = doc.find(section)
-            values = section.find("values")
-            anon = values.find("anon")
-            value = anon.attrib[key]
-            return value
-        except Exception as err:
-            LOGGER.exception("Cannot parse %s: %s", str(fname), str(err))
+            mtime_ns = fname.stat().st_mtime_ns
+        except OSError:
+            LOGGER.error("%s NOT found", str(fname))
             return ""
+        return read_project_xml_value(str(fname), mtime_ns, section, key)
 
     def send_email(
         self,
@@ -1578,6 +2061,9 @@ class Dsync(object):
         Sends an email with `subject`, from `sender` to `recipients` with the given
         `content`.
         """
+        import smtplib
+        from email.message import EmailMessage
+
         msg = EmailMessage()
         msg.set_content(content)
         msg["Subject"] = subject
@@ -1592,6 +2078,8 @@ class Dsync(object):
 
 def main():
     """Main routine that is invoked when you run the script"""
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Test script for the Dsync class.",
         add_help=True,
@@ -15,10 +15,14 @@
 """
 
 import argparse
+import itertools
 import os
 import queue
+import re
 import subprocess
 import threading
+import time
+from concurrent.futures import Future, wait
 from contextlib import contextmanager
 
 try:
@@ -52,6 +56,7 @@ class Process(object):
         thread: stores the handle for the read thread
         read_running: bool that indicates that the read is running
         stream: bool that is true when streaming output
+        on_close: callables run (last first) when run_shell shuts the process down
 """
 
     def __init__(
@@ -82,6 +87,7 @@ class Process(object):
         self.read_running = False
         self.stream = False
         self.run_process = True
+        self.on_close = []
 
     def read_output(self) -> str:
         """runs a separate thread reading stdout from the process"""
@@ -145,7 +151,14 @@ class Process(object):
         # print(f"Send command {cmd}")
         self.send_command(cmd, test_mode)
         resp = self.get_response(test_mode=test_mode)
-        return resp.rstrip(self.prompt).strip()
+        return self.strip_prompt(resp)
+
+    def strip_prompt(self, resp: str) -> str:
+        """remove the trailing prompt (not the characters of the prompt) from a
+        response and strip the surrounding whitespace"""
+        if self.prompt and resp.endswith(self.prompt):
+            resp = resp[: -len(self.prompt)]
+        return resp.strip()
 
     def stream_command(self, cmd: str, test_mode: bool = False) -> str:
         """generator used to stream the specified command"""
@@ -154,14 +167,17 @@ class Process(object):
         self.send_command(cmd, test_mode)
         resp = ""
         if test_mode:
-            raise StopIteration
+            return
 
         while not resp.endswith(self.prompt):
             resp = self.get_response_no_timeout()
             yield resp
 
         self.stream = False
-        raise StopIteration
+
+    def pipeline(self) -> "CommandRing":
+        """return a CommandRing used to send commands without waiting for the responses"""
+        return CommandRing(self)
 
     # def set_env(self, env_vars: Dict) -> None:
     #    # TODO - merge?
@@ -199,24 +215,131 @@ class Process(object):
             # TODO - how to capture the error?
             # TODO - anything to back out
             LOGGER.exception(f"Exception from run_shell")
-            if self.run_process and self.end_cmd:
+            if self.process_running() and self.end_cmd:
                 self.send_command(self.end_cmd)
             raise
         else:
             LOGGER.debug(f"Shutting down")
-            if self.run_process and self.end_cmd:
+            if self.process_running() and self.end_cmd:
                 self.send_command(self.end_cmd)
+        finally:
+            while self.on_close:
+                self.on_close.pop()()
+
+    def process_running(self) -> bool:
+        """return True if the process was started and has not exited"""
+        if not self.run_process or self.thread is None:
+            return False
+        return self.process.poll() is None
 
     # TODO - add timeout
     def wait_for_shell(self) -> bool:
-        """called within the run_shell context manager to wait for the initial prompt"""
-        try:
-            if not self.run_process:
-                return True
-            resp = self.get_response(self.init_timeout)
+        """called within the run_shell context manager to wait for the initial prompt,
+        gives up early if the process exits (e.g. no license is available)"""
+        if not self.run_process:
             return True
-        except queue.Empty:
-            return False
+        deadline = time.monotonic() + self.init_timeout
+        while True:
+            try:
+                resp = self.get_response(0.1)
+                return True
+            except queue.Empty:
+                if not self.process_running() or time.monotonic() >= deadline:
+                    return False
+
+
+class CommandRing(object):
+    """Class to pipeline commands to a running Process
+    Commands are written to the process as soon as they are submitted, without
+    waiting for the response of the previous command. Each command is framed by
+    Tcl puts of begin/end markers tagged with its id, and a separate thread
+    collects the output of the process and completes the future of the command
+    whose markers frame the response. The process should not be used with
+    run_command/stream_command while the ring is open.
+    Examples:
+        with sh.run_shell():
+            sh.wait_for_shell()
+            with sh.pipeline() as ring:
+                futures = [ring.submit(cmd) for cmd in cmds]
+                resps = [future.result() for future in futures]
+    Attributes:
+        process: the Process the commands are sent to
+        inflight: futures of the commands waiting for a response, by id
+        thread: stores the handle for the completion thread
+    """
+
+    # The result (or error) of the command is printed like the shell would
+    FRAME = (
+        'puts "__SQE_{id}_BEGIN__"; catch {{{cmd}}} _sqe; puts $_sqe; '
+        'puts "__SQE_{id}_END__"'
+    )
+    FRAME_RE = re.compile(r"__SQE_(\d+)_BEGIN__\n(.*?)__SQE_\1_END__\n?", re.S)
+
+    def __init__(self, process: Process) -> None:
+        """Initializer for the CommandRing class"""
+        self.process = process
+        self.inflight = {}
+        self.thread = None
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CommandRing":
+        while not self.process.queue.empty():
+            resp = self.process.queue.get()
+            LOGGER.warn(f"WARNING! purging output {resp}")
+        self.thread = threading.Thread(target=self.complete)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with self._lock:
+            pending = list(self.inflight.values())
+        wait(pending, timeout=self.process.timeout)
+        self.process.queue.put(None)
+        self.thread.join()
+        for future in self.inflight.values():
+            future.set_exception(queue.Empty())
+        self.inflight.clear()
+
+    def submit(self, cmd: str) -> Future:
+        """send the command to the process and return the future for its response"""
+        future = Future()
+        LOGGER.debug(f"cmd = {cmd}")
+        with self._lock:
+            cmd_id = next(self._ids)
+            self.inflight[str(cmd_id)] = future
+            cmd = self.FRAME.format(id=cmd_id, cmd=cmd)
+            self.process.process.stdin.write(f"{cmd}\n".encode())
+            self.process.process.stdin.flush()
+        return future
+
+    def complete(self) -> None:
+        """runs a separate thread completing the futures with the process responses"""
+        output = ""
+        while True:
+            resp = self.process.queue.get()
+            if resp is None:
+                return
+            output += resp
+            pos = 0
+            for match in self.FRAME_RE.finditer(output):
+                self.check_unexpected(output[pos : match.start()])
+                pos = match.end()
+                with self._lock:
+                    future = self.inflight.pop(match.group(1), None)
+                if future is None:
+                    LOGGER.warn(f"WARNING! unexpected output {match.group(0)}")
+                    continue
+                future.set_result(match.group(2).strip())
+            output = output[pos:]
+
+    def check_unexpected(self, output: str) -> None:
+        """warn about output found outside of the markers, other than prompts"""
+        if self.process.prompt:
+            output = output.replace(self.process.prompt, "")
+        if output.strip():
+            LOGGER.warn(f"WARNING! unexpected output {output.strip()}")
 
 
 def main():
@@ -7,7 +7,7 @@ import os
 import subprocess
 import sys
 from datetime import datetime
-from functools import wraps
+from functools import lru_cache, wraps
 from pathlib import Path
 from typing import Dict, Iterable, Optional
 
@@ -30,19 +30,24 @@ except ImportError:
     except ImportError:
         pass
 
+LOGGER = log.getLogger(__name__)
 
-try:
-    from dm import *
-except ImportError:
+
+def import_dm() -> None:
+    """
+    Import the DM modules, deferred until the arguments are parsed since they
+    pull in pandas and lxml which --help and argument errors do not need.
+    """
+    global Cadence, Dsync, Process
     try:
-        pwd = os.path.dirname(os.path.abspath(__file__))
-        sys.path.insert(0, pwd + '/../dm')
-        from dm import *
+        from dm import Cadence, Dsync, Process
     except ImportError:
-        pass
-#from dm import *  # isort:skip
-
-LOGGER = log.getLogger(__name__)
+        try:
+            pwd = os.path.dirname(os.path.abspath(__file__))
+            sys.path.insert(0, pwd + '/../dm')
+            from dm import Cadence, Dsync, Process
+        except ImportError:
+            pass
 
 
 def command(*, setup: callable = None):
@@ -888,8 +893,9 @@ def release(dm, args: argparse.Namespace) -> int:
     return dm.sitr_release(args.comment, email=email)
 
 
-def setup_args_parser():
-    """Configures the argument parser."""
+@lru_cache(maxsize=1)
+def build_args_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser once, repeated calls reuse the same parser."""
     parser = argparse.ArgumentParser(
         description="Script to run SITaR commands.",
         add_help=True,
@@ -978,6 +984,12 @@ def setup_args_parser():
             setup = getattr(value, "__setup__", None)
             if callable(setup):
                 setup(subparser)
+    return parser
+
+
+def setup_args_parser():
+    """Configures the argument parser."""
+    parser = build_args_parser()
     args = parser.parse_args()
     if args.command is None and not args.interactive:
         parser.print_help()
@@ -1118,6 +1130,7 @@ def run_with_args(args) -> int:
     log.info("Logging to %s", str(LOG_FILE))
     if args.debug:
         log.set_debug()
+    import_dm()
     run_doctests(args.test)
     start_dir = get_start_dir(None)
     if running_inside_dmsh():
@@ -12,6 +12,7 @@ __all__ = [
     "critical",
     "fatal",
     "getLogger",
+    "ensure_configured",
     "DEBUG",
     "INFO",
     "WARNING",
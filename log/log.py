@@ -4,7 +4,6 @@ and designed to be a drop-in replacement for the same.
 Just use `import log` instead of `import loggging`.
 """
 
-import json
 import logging
 import logging.handlers
 import os
@@ -35,26 +34,94 @@ DATETIME = "%Y-%m-%d %H:%M:%S.%u"
 # Root logger.
 ROOT = logging.getLogger()
 
+# Formatters shared by the handlers installed with the default formats.
+FILE_FORMATTER = logging.Formatter(fmt=FORMAT, datefmt=DATETIME)
+CONSOLE_FORMATTER = logging.Formatter(fmt="%(levelname)s: %(message)s")
+
+# None of the formats use the thread/process fields, skip collecting them.
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+
+class FastRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that does not stat the log file for every record, the
+    check that the log file is a regular file is only done when it is opened.
+    Backups get increasing suffixes (<log>.1, <log>.2, ...) instead of being
+    renamed on every rollover, the highest suffix is the most recent backup.
+    """
+
+    def _open(self):
+        path = self.baseFilename
+        self._base_is_file = not os.path.exists(path) or os.path.isfile(path)
+        return super()._open()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        # Only rotated explicitly (doRollover) when no size limit is set
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        if not self._base_is_file:
+            return False
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.maxBytes
+
+    def doRollover(self) -> None:
+        """
+        Rename the log to the next suffix (kept in <log>.idx) and remove the backup
+        that is now more than backupCount rotations old, so a rollover is a single
+        rename instead of shifting every backup up by one.
+        """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if self.backupCount > 0 and os.path.exists(self.baseFilename):
+            idx_file = Path(f"{self.baseFilename}.idx")
+            try:
+                idx = int(idx_file.read_text())
+            except (OSError, ValueError):
+                idx = 1
+            self.rotate(
+                self.baseFilename, self.rotation_filename(f"{self.baseFilename}.{idx}")
+            )
+            # Keep the backupCount most recent backups (idx - backupCount + 1 .. idx),
+            # there is nothing to remove until that many rollovers happened
+            stale = idx - self.backupCount
+            if stale > 0:
+                try:
+                    os.remove(self.rotation_filename(f"{self.baseFilename}.{stale}"))
+                except FileNotFoundError:
+                    pass
+            idx_file.write_text(str(idx + 1))
+        if not self.delay:
+            self.stream = self._open()
+
+
+# Set once configure() has installed the handlers.
+_configured = False
+
 
 def configure(
     filename: Path = LOGFILE, level=logging.INFO, format=FORMAT, datefmt=DATETIME
 ) -> None:
     """
-    Configure logging subsystem. This should be called automatically on
-    importing this module.
+    Configure logging subsystem. This is called automatically when the first
+    log record is emitted, calling it again has no effect.
     """
-    logging.basicConfig(
-        filename=Path(filename),
-        filemode="a",
-        format=format,
-        datefmt=datefmt,
-        level=logging.DEBUG,
-    )
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    ROOT.setLevel(logging.DEBUG)
 
     # Rotate logs after 20 runs
-    handler = logging.handlers.RotatingFileHandler(filename, backupCount=20)
+    handler = FastRotatingFileHandler(filename, backupCount=20)
     handler.setLevel(logging.DEBUG)
-    file_formatter = logging.Formatter(fmt=format, datefmt=datefmt)
+    if format == FORMAT and datefmt == DATETIME:
+        file_formatter = FILE_FORMATTER
+    else:
+        file_formatter = logging.Formatter(fmt=format, datefmt=datefmt)
     handler.setFormatter(file_formatter)
     ROOT.addHandler(handler)
     handler.doRollover()
@@ -62,14 +129,34 @@ def configure(
     # Log both to file and console
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_formatter = logging.Formatter(fmt="%(levelname)s: %(message)s")
-    console_handler.setFormatter(console_formatter)
+    console_handler.setFormatter(CONSOLE_FORMATTER)
     ROOT.addHandler(console_handler)
 
 
-# Ensure logging is configured as soon as this module is imported.
+def ensure_configured() -> None:
+    """
+    Configure logging with the defaults unless it is already configured.
+    """
+    configure()
+
 
-configure()
+class _ConfigureOnEmit(logging.Handler):
+    """
+    Root handler installed on import, configures logging when the first record is
+    emitted so that importing this module does not open (and rotate) the log file.
+    The handlers added by configure() are appended to the root handlers, so they
+    also receive the first record.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        configure()
+        return False
+
+
+# Defer opening the log file until something is logged, the root level is set
+# now so that records reach the deferred handler.
+ROOT.setLevel(logging.DEBUG)
+ROOT.addHandler(_ConfigureOnEmit())
 
 
 def set_debug() -> None:
@@ -91,21 +178,19 @@ def call_arguments() -> None:
     """
     Call to log the invoked function / method and the passed arguments.
     """
-    import inspect
-
-    current_frame = inspect.currentframe()
-    caller_frame = inspect.getouterframes(current_frame, 2)
-    filename = Path(caller_frame[1].filename)
-    module_path = ".".join([filename.parent.name, filename.name.replace(".py", "")])
+    frame = sys._getframe(1)
+    filename = Path(frame.f_code.co_filename)
+    module_path = ".".join([filename.parent.name, filename.stem])
     logger = logging.getLogger(module_path)
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
 
+    local_vars = frame.f_locals
     logger.debug(
         "%s.%s(%s)",
-        caller_frame[1][0].f_locals.get("self", object()).__class__.__qualname__,
-        caller_frame[1][0].f_code.co_name,
-        json.dumps(
-            {k: str(v) for k, v in caller_frame[1][0].f_locals.items() if k != "self"}
-        ),
+        local_vars.get("self", object()).__class__.__qualname__,
+        frame.f_code.co_name,
+        ", ".join(f"{k}={v}" for k, v in local_vars.items() if k != "self"),
     )
 
 